@@ -0,0 +1,271 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.lines as mlines
+
+from DB_LGR_py import (
+    debug,
+    timed,
+    import_DB,
+    import_LGR,
+    import_runs,
+    LogTail,
+    time_window,
+    elapsed_seconds,
+    decimate_indices,
+    frac_calc_array,
+    delta_calc_array,
+)
+
+print('%%%%%%%%% Dirtburner - Flow-through LGR Data Visualization %%%%%%%%%%%%')
+
+#Plotting functions for Dirtburner and LGR CCIA data. These are kept apart from DB_LGR_py so that parsing and
+#isotope calculations can be imported without Matplotlib. They are still available as DB_LGR_py.<function>,
+#which loads this module the first time one of them is used.
+
+def _plot_rows(ax, y, decimate):
+    '''Rows of y to plot on ax: about two per pixel of the axes width when decimate is True, otherwise all rows.'''
+    if not decimate:
+        return np.arange(len(y))
+
+    return decimate_indices(y, max(int(2 * ax.bbox.width), 2))
+
+@timed
+def view_concentrations(ccia_df, db_df, begin_timestamp, end_timestamp, time_offset, decimate=True):
+    '''
+    Initial data view comparison of the [CO2] data in the dirtburner and in the LRG CCIA.
+    This function takes the two dataframes, two timestamps marking the beginning and end of 
+    the data gathering period, and plots the data in a 3-panel plot. The time offset is for 
+    adjusting the time if the computers are registering different times for the duration of the runs
+
+        Inputs:
+            ccia_df (dataframe) - the output of the import_LGR function. A dataframe with 105 columns rows 
+                from approximately every second of data acquisition.
+            db_df (dataframe) - the output of the import_DB function. A dataframe with 7 columns and rows
+                from approxaimtely every second of data acquisition.
+            begin_timestamp (pandas timestamp) - a string in the format 'YYYY-mm-dd HH:MM' to mark the beginning
+                of the experiment
+            end_timestamp (pandas timestamp) - a string in the format 'YYYY-mm-dd HH:MM' to mark the end
+                of the experiment
+            time_offset (floating point number) - The number of hours of offset there is between the CCIA and 
+                DB computer, if there is any offset. Good laboratory practice would be to ensure that there is 
+                no offset, however this allows you to adjust for instance, if you have to reboot the linux system
+                controlling the LGR CCIA system.
+            decimate (boolean) - if True, plot only the minimum and maximum of each pixel-sized bucket of data (see
+                decimate_indices) so long runs draw quickly. Set to False for publication figures. Default is True
+        
+        Outputs:
+            ax1 (matplotlib axes handle) - this is the handle returned so that you can make changes to the axes
+                (axis labels, fonts, etc.) after using the function. There are three axes, 0 is the top and 2 
+                is the bottom
+
+
+    '''
+    #Mask the dataframes to isolate only the data that the viewer wants to view. 
+    ccia_run_df = time_window(ccia_df, begin_timestamp, end_timestamp)
+    db_run_df = time_window(db_df, begin_timestamp, end_timestamp)
+    
+    del_time = pd.Timedelta(hours=time_offset) #This accounts for any difference in times between the computers.
+    fig1, ax1 = plt.subplots(nrows=3, ncols=1, sharex=True)
+    ccia_run_df = ccia_run_df.iloc[_plot_rows(ax1[0], ccia_run_df['[CO2]_ppm'], decimate)]
+    db_run_df = db_run_df.iloc[_plot_rows(ax1[1], db_run_df['pCO2'], decimate)]
+    ax1[0].plot(ccia_run_df['Time'] - del_time, ccia_run_df['[CO2]_ppm'])
+    ax1[0].set(title='LGR')
+    ax1[1].plot(db_run_df['Time'], db_run_df['pCO2'], color='peru')
+    ax1[1].set(title='DB')
+    plt.xticks(rotation=30, ha='right')
+    ax1[2].plot(ccia_run_df['Time'] - del_time, ccia_run_df['[CO2]_ppm'])
+    ax1[2].plot(db_run_df['Time'], db_run_df['pCO2'], color='peru')
+
+    ax1[2].set(xlabel='Time', title='DB and LGR')
+    big_ax1 = fig1.add_subplot(111, frameon=False)
+    plt.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
+    big_ax1.set(ylabel=r'pCO$_{2}$, ppm')
+
+    return ax1
+
+def update_concentrations(ax1, ccia_chunk, db_chunk, time_offset):
+    '''
+    Append new rows to a figure made by view_concentrations. The new data is added to the existing line artists 
+    instead of replotting, so refreshing a live view only costs the size of the new chunks.
+        Inputs:
+            ax1 (matplotlib axes handle): the axes returned by view_concentrations
+            ccia_chunk (dataframe): new CCIA rows, e.g. from LogTail.read
+            db_chunk (dataframe): new DB rows, e.g. from LogTail.read
+            time_offset (floating point number): the same offset, in hours, used for view_concentrations
+    '''
+    del_time = pd.Timedelta(hours=time_offset)
+    if len(ccia_chunk) == 0:
+        ccia_chunk = pd.DataFrame({'Time': pd.to_datetime([]), '[CO2]_ppm': []})
+    if len(db_chunk) == 0:
+        db_chunk = pd.DataFrame({'Time': pd.to_datetime([]), 'pCO2': []})
+    ccia_lines = [ax1[0].lines[0], ax1[2].lines[0]]
+    db_lines = [ax1[1].lines[0], ax1[2].lines[1]]
+    for lines, x, y in (
+        (ccia_lines, ccia_chunk['Time'] - del_time, ccia_chunk['[CO2]_ppm']),
+        (db_lines, db_chunk['Time'], db_chunk['pCO2']),
+    ):
+        for line in lines:
+            old_x, old_y = line.get_data()
+            line.set_data(np.concatenate([old_x, x.to_numpy()]), np.concatenate([old_y, y.to_numpy()]))
+    for ax in ax1:
+        ax.relim()
+        ax.autoscale_view()
+    ax1[0].figure.canvas.draw_idle()
+
+def live_view_concentrations(ccia_file, db_file, begin_timestamp, time_offset=0, poll_interval=5, refreshes=None):
+    '''
+    Live version of view_concentrations for a run in progress. Both files are followed with LogTail and the
+    three panel plot is extended with each new chunk of rows, so the real-time signal can be watched while 
+    the run goes. Interrupt the kernel (or set refreshes) to stop watching.
+        Inputs:
+            ccia_file (string): file name, including extension, of the growing CCIA file
+            db_file (string): file name, including extension, of the growing DB file
+            begin_timestamp (pandas timestamp) - a string in the format 'YYYY-mm-dd HH:MM' to mark the beginning
+                of the experiment
+            time_offset (floating point number) - The number of hours of offset there is between the CCIA and 
+                DB computer, see view_concentrations. Default is 0
+            poll_interval (float): seconds between refreshes. Default is 5
+            refreshes (int): number of refreshes before returning. Default None keeps watching until interrupted
+        Outputs:
+            ax1 (matplotlib axes handle) - the axes of the live figure, as returned by view_concentrations
+    '''
+    ccia_tail = LogTail(ccia_file, import_LGR)
+    db_tail = LogTail(db_file, import_DB)
+    #Wait for the first rows of both files so the figure can be laid out
+    ax1 = view_concentrations(
+        next(ccia_tail.follow(poll_interval)), next(db_tail.follow(poll_interval)), begin_timestamp, None, time_offset
+    )
+    count = 0
+    try:
+        while refreshes is None or count < refreshes:
+            plt.pause(poll_interval)
+            count += 1
+            ccia_chunk = ccia_tail.read()
+            db_chunk = db_tail.read()
+            if len(ccia_chunk) == 0 and len(db_chunk) == 0:
+                continue
+            update_concentrations(
+                ax1,
+                time_window(ccia_chunk, begin_timestamp, None),
+                time_window(db_chunk, begin_timestamp, None),
+                time_offset
+            )
+    except KeyboardInterrupt:
+        pass
+
+    return ax1
+
+@timed
+def compare_CCIA(runs, timestamps, colors, legend_labels, column_name='d13C', cache=False, max_workers=None, decimate=True):
+    '''
+    Function to compare different CCIA runs. User chooses colors, run files, timestamps, and column to plot. Function
+    computes elapsed time for each run and plots on time axis. DB data files are not used, this should only be pointed 
+    at CCIA files. 
+
+        Inputs:
+            runs (list of strings): List of file names, including extension, of the files (runs) you want to compare
+            timestamps (list of tuples of strings): List of tuples, each containing the begin time and end time of a reaction
+                entered as strings. Format should be 2023-02-10 09:52:00 (YYYY-MM-DD HH:mm:SS). 
+            colors (list of strings): Strings for named colors in python Matplotlib
+            legend_labels (list of strings): String to describe each run as you want in the figure legend.
+            col (string): column you wish to plot. Columns must match those available in call to df.columns function, or will default
+                to plotting the d13C column
+            cache (boolean): if True, runs are loaded through the on-disk cache (see load_cached) so redrawing
+                the comparison does not reparse every file. Default is False
+            max_workers (int): number of runs imported at once, see import_runs. Default None uses one worker per CPU
+            decimate (boolean): if True, plot only the minimum and maximum of each pixel-sized bucket of data (see
+                decimate_indices). Set to False for publication figures. Default is True
+    '''
+
+    fig, ax = plt.subplots(nrows=1, ncols=1)
+    label_list = []
+    #import all of the runs at once
+    run_dfs = import_runs(
+        {run: run for run in runs}, columns=['Time', column_name, 'd13C'], cache=cache, max_workers=max_workers
+    )
+    for j, run in enumerate(runs):
+        df = run_dfs[run]
+        if column_name not in df.columns:
+            print('!! Specified column, ', column_name, ', is not in ', run, '. Defaulting to plot of d13C vs. elapsed time for this run. !!')
+            plot_column = 'd13C'
+        else:
+            plot_column = column_name
+        masked_df = time_window(df, timestamps[j][0], timestamps[j][1])
+        rows = _plot_rows(ax, masked_df[plot_column], decimate)
+        ax.plot(elapsed_seconds(masked_df)[rows], masked_df[plot_column].to_numpy()[rows], color=colors[j])
+        #Create legend label list
+        label_list.append(mlines.Line2D([], [], color=colors[j], label=legend_labels[j]))
+
+    #Choose column name:
+    if column_name == 'd13C':
+        y_label = r'$\delta^{13}$C, relative'
+    elif column_name == '[CO2]_ppm':
+        y_label = r'[CO$_{2}$], ppm'
+    else:
+        y_label = column_name
+    ax.set_xlabel('Elapsed time, s')
+    ax.set_ylabel(y_label)
+    plt.legend(handles=label_list)
+    
+    return ax
+
+@timed
+def isotope_concentration_plot(df, delta_baseline, delta_meas_uncertainty, delta_calc_threshold, timestamps, color_map='plasma', null_color='k', decimate=True):
+    '''
+    Plots a concentration vs. time plot, and colors the points with calculated isotope values. The calculation of 
+    isotope values depends on an assumption that the minimum concentration of the run is the baseline value
+    and any elevation in [CO2] is due to admixture of the sample. The calculation involves the fraction of sample
+    in the denominator, so at low values (just above baseline), the calculated isotope values can be 
+    erroneously high. To avoid this, the function asks you to enter the uncertainty on isotope measurements
+    as well as what uncertainty you are willing to work with on the calculation. The lower the concentration, the
+    higher the uncertainty with this instrument. The value you pick for delta_calc_threshold would be positive,
+    and always moe than delta_meas_uncertainty. The closer these values are to one another, the more
+    data will be masked black. 
+        Inputs:
+            df (dataframe): Dataframe loaded from the import_LGR function
+            delta_meas_uncertainty (float): Assumed or known uncertainty on an isotope measurement of the LGR-CCIA
+            delta_calc_threshold (float): Your level of acceptable uncertainty (in permil) of the calculated 
+                isotope value of the sample. 
+            timestamps (tuple of strings): a tuple in the form of (begin, end) where both beginning and end
+                are strings in the format of YYYY-MM-DD HH:mm:SS
+            color_map (matplotlib color map, string): a string representing the desired existing colormap
+                recognized by matplotlib.pyplot. Default is plasma
+            null_color (single matplotlib color string): string representing a single named color in Python
+                This color will mark the points that have uncertainties beyond your threshold. Default = k
+            decimate (boolean): if True, plot only the minimum and maximum concentration of each pixel-sized bucket
+                of points (see decimate_indices). Set to False for publication figures. Default is True
+        
+
+    '''
+    #Add columns to the dataframes for both the fraction (first function above) and the delta value of the sample (second function)
+    min_conc = df['[CO2]_ppm'].min()
+    df['frac_sam'] = frac_calc_array(df['[CO2]_ppm'], min_conc)
+    df['delta_sam'] = delta_calc_array(df['d13C'], delta_baseline, df['frac_sam'])
+    #Slice out the window and calculate elapsed time, without copying the dataframe
+    masked_df = time_window(df, timestamps[0], timestamps[1])
+    elapsed_time = elapsed_seconds(masked_df)
+    conc = masked_df['[CO2]_ppm'].to_numpy()
+
+    #Split the window into that which can be plotted as an isotope value, and that which cannot
+    with np.errstate(divide='ignore'):
+        has_iso = delta_meas_uncertainty/masked_df['frac_sam'].to_numpy() < delta_calc_threshold
+    debug(has_iso.sum())
+    debug((~has_iso).sum())
+    df_out = df
+
+    #Plot concentrations, colored with isotope values (values with uncertainties > delta_calc_threshold are black dots)
+    scat_fig, scat_ax = plt.subplots(nrows=1, ncols=1)
+    iso_rows = np.flatnonzero(has_iso)
+    iso_rows = iso_rows[_plot_rows(scat_ax, conc[iso_rows], decimate)]
+    no_iso_rows = np.flatnonzero(~has_iso)
+    no_iso_rows = no_iso_rows[_plot_rows(scat_ax, conc[no_iso_rows], decimate)]
+    g = scat_ax.scatter(elapsed_time[iso_rows], conc[iso_rows], s=10, c=masked_df['delta_sam'].to_numpy()[iso_rows], cmap=color_map)
+    scat_ax.plot(elapsed_time[no_iso_rows], conc[no_iso_rows], marker='.', mec=null_color, linestyle='', mfc='None')
+    #scat_ax.annotate(r'Carrier gas $\delta^{13}$C = ' + str(delta_baseline) + '/n', )
+    cbar = scat_fig.colorbar(g)
+    scat_ax.set_ylabel(r'[CO$_{2}$], ppm')
+    scat_ax.set_xlabel('Elapsed time, s')
+    cbar.set_label(r'$\delta^{13}$C, calculated')
+
+    return scat_ax, cbar, df_out
@@ -1,9 +1,16 @@
+import io
+import os
+import re
+import sys
+import glob
+import json
+import time
+import hashlib
+import functools
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.lines as mlines
-
-print('%%%%%%%%% Dirtburner - Flow-through LGR Data Visualization %%%%%%%%%%%%')
 
 #To turn on debugging, do this in your code:
     #import process_db as DB
@@ -11,48 +18,451 @@ print('%%%%%%%%% Dirtburner - Flow-through LGR Data Visualization %%%%%%%%%%%%')
     #Change this variable to True to debug any functions in the DB package. Enter this line in any cell to debug code in that cell.
 DEBUG = False
 
+#Functions defined in DB_LGR_plot. They are loaded on first use, so importing this module does not import Matplotlib
+PLOT_FUNCTIONS = (
+    'view_concentrations',
+    'update_concentrations',
+    'live_view_concentrations',
+    'compare_CCIA',
+    'isotope_concentration_plot',
+)
+
+#Columns of the tab separated Dirtburner files, in file order
+DB_COLUMNS = ['Time', 'pCO2', 'Temperature', 'He_main', 'He_side', 'O2']
+
+#Marks the start of the signature block the LGR software writes after the last row of data
+PGP_FOOTER = b'-----BEGIN PGP MESSAGE-----'
+#Timestamp layout of the Time column in CCIA files, e.g. 03/23/23 08:16:52.150
+LGR_TIME_FORMAT = '%m/%d/%y %H:%M:%S.%f'
+
+#Integer and text columns of the CCIA files, every other column except Time holds floating point data
+LGR_INTEGER_COLUMNS = ('Fit_Flag', "N_Fits_Avg'd", 'MIU_valve')
+LGR_TEXT_COLUMNS = ('MIU_desc.',)
+
+#Parsed runs are cached next to the source file as Parquet when pyarrow is installed, otherwise as a pickle
+CACHE_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') is not None else 'pickle'
+
 def debug(*args):
     """Call print() with arguments if DEBUG is True""" # preserves formatting
     if DEBUG == True:
         print(*args)
 
-
-def import_DB(file):
+def __getattr__(name):
+    """Load the plotting functions from DB_LGR_plot the first time one of them is used"""
+    if name in PLOT_FUNCTIONS:
+        import DB_LGR_plot
+        return getattr(DB_LGR_plot, name)
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+def timed(function):
+    """Decorator for the pipeline stages. If DEBUG is True, log how long each call took and how many rows it handled"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if DEBUG != True:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        duration = time.perf_counter() - start
+        #Count the rows of the first dataframe passed in, or else of the returned dataframe
+        candidates = list(args) + [result] + list(result if isinstance(result, tuple) else ())
+        rows = next((len(a) for a in candidates if isinstance(a, pd.DataFrame)), None)
+        debug('Timing:', function.__name__, 'took %.4f s' % duration, '' if rows is None else 'for %d rows' % rows)
+        return result
+
+    return wrapper
+
+
+@timed
+def import_DB(file, columns=None, dtype=None, compact=False, cache=False):
+    '''
+    Import a Dirtburner data file. The file is tab separated with the LabView timestamp in the first column.
+        Inputs:
+            file (string): file name, including extension, of the DB file
+            columns (list of strings): optional list of the columns to parse, e.g. ['Time', 'pCO2']. The Time
+                column is always included. Default None parses all columns
+            dtype (dictionary): optional map of column name to dtype, e.g. {'pCO2': 'float32'}
+            compact (boolean): if True, store every column except Time as float32 to halve the memory
+                used by the data. Entries in dtype take precedence. Default is False
+            cache (boolean): if True, load the parsed dataframe through load_cached so that repeated imports
+                of an unchanged file skip the text parsing. Default is False
+        Outputs:
+            db_df (dataframe): dataframe with 6 columns and rows from approximately every second of data acquisition
+    '''
+    if cache:
+        return load_cached(file, import_DB, columns=columns, dtype=dtype, compact=compact)
+    names = DB_COLUMNS
+    usecols = None
+    if columns is not None:
+        usecols = [name for name in names if name == 'Time' or name in columns]
+    col_dtypes = {}
+    if compact:
+        col_dtypes = {name: 'float32' for name in names if name != 'Time'}
+    if dtype is not None:
+        col_dtypes.update(dtype)
     db_df = pd.read_csv(
         file,
         delimiter='\t',
         header=None, 
-        names=[
-            'Time',
-            'pCO2',
-            'Temperature',
-            'He_main',
-            'He_side',
-            'O2'
-        ]
+        names=names,
+        usecols=usecols,
+        dtype=col_dtypes or None
     )
 
     db_df = convert_dates(db_df)
+    db_df = _sort_by_time(db_df)
 
     return db_df
 
-def import_LGR(file):
+def find_LGR_footer(raw):
+    '''
+    Find the byte offset where the data block of a CCIA file ends. The LGR software appends a PGP 
+    message of variable length after the data rows, so the footer is located by searching the raw
+    bytes for the start of that block rather than assuming a fixed number of footer lines.
+        Inputs:
+            raw (bytes): contents of a CCIA file read in binary mode
+        Outputs:
+            data_end (int): byte offset of the first footer line, or the length of raw if there is no footer
+    '''
+    data_end = raw.find(PGP_FOOTER)
+    if data_end == -1:
+        data_end = len(raw)
+
+    return data_end
+
+@timed
+def import_LGR(file, columns=None, dtype=None, compact=False, keep_subseconds=False, cache=False):
+    '''
+    Import a CCIA data file from the LGR flow-through analyzer. The file is read once as bytes, the
+    PGP footer is located with find_LGR_footer, and only the rows before it are parsed with the pandas
+    C engine. The parse is bounded by a row count rather than a slice of the bytes, so the file is not
+    copied a second time.
+        Inputs:
+            file (string): file name, including extension, of the CCIA file
+            columns (list of strings): optional list of the columns to parse, e.g. ['Time', '[CO2]_ppm', 'd13C'].
+                The Time column is always included. Default None parses all 105 columns
+            dtype (dictionary): optional map of column name to dtype, e.g. {'d13C': 'float32'}
+            compact (boolean): if True, store the floating point columns as float32 and the MIU_desc. column as
+                a categorical to cut the memory used by the data. Entries in dtype take precedence. Default is False
+            keep_subseconds (boolean): if True, keep the millisecond part of the LGR timestamps. Default is
+                False, which floors each timestamp to the whole second
+            cache (boolean): if True, load the parsed dataframe through load_cached so that repeated imports
+                of an unchanged file skip the text parsing. Default is False
+        Outputs:
+            ccia_df (dataframe): dataframe with 105 columns and rows from approximately every second of 
+                data acquisition
+    '''
+    if cache:
+        return load_cached(
+            file, import_LGR, columns=columns, dtype=dtype, compact=compact, keep_subseconds=keep_subseconds
+        )
+    with open(file, 'rb') as f:
+        raw = f.read()
+    data_end = find_LGR_footer(raw)
+    debug('Footer of', file, 'begins at byte', data_end, 'of', len(raw))
+    names = {name.strip(): name for name in _LGR_header_names(raw)}
+    usecols = None
+    if columns is not None:
+        usecols = [names[name] for name in names if name == 'Time' or name in columns]
+    col_dtypes = {}
+    if compact:
+        for name in names:
+            if name in LGR_TEXT_COLUMNS:
+                col_dtypes[names[name]] = 'category'
+            elif name != 'Time' and name not in LGR_INTEGER_COLUMNS:
+                col_dtypes[names[name]] = 'float32'
+    if dtype is not None:
+        col_dtypes.update({names.get(name, name): value for name, value in dtype.items()})
+    #Data rows are the lines before the footer, less the date and header lines
+    n_lines = raw.count(b'\n', 0, data_end)
+    if data_end > 0 and raw[data_end - 1:data_end] != b'\n':
+        n_lines += 1
     ccia_df = pd.read_csv(
-        file,
+        io.BytesIO(raw),
         skiprows=1,
-        engine='python',
-        skipfooter=283
+        nrows=max(n_lines - 2, 0),
+        engine='c',
+        usecols=usecols,
+        dtype=col_dtypes or None
     )
 
+    ccia_df = _convert_LGR_times(ccia_df, keep_subseconds)
+    ccia_df = _sort_by_time(ccia_df)
+
+    return ccia_df
+
+def _LGR_header_names(raw):
+    '''Return the column names, padded with spaces as written, from the second line of a CCIA file.'''
+    return raw.split(b'\n', 2)[1].decode().rstrip('\r').split(',')
+
+def _convert_LGR_times(ccia_df, keep_subseconds):
+    '''Strip the padding from the column names and parse the Time column of a freshly read CCIA dataframe.'''
     col_names = [a.lstrip() for a in ccia_df.columns]
     ccia_df.columns = col_names
-    ccia_df['Time'] = pd.to_datetime(ccia_df['Time'])
-    a = [timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp in ccia_df['Time']]
-    ccia_df['Time'] = pd.to_datetime(a)
-
+    ccia_df['Time'] = pd.to_datetime(ccia_df['Time'].str.strip(), format=LGR_TIME_FORMAT)
+    if not keep_subseconds:
+        ccia_df['Time'] = ccia_df['Time'].dt.floor('s')
 
     return ccia_df
 
+def _file_hash(file):
+    '''Return the BLAKE2 hex digest of the contents of file.'''
+    h = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+def cache_paths(file, import_function, **kwargs):
+    '''
+    Names of the cache files that belong to a data file. The cache lives next to the source file, and each
+    import function and set of keyword arguments gets its own files, so e.g. compact and full imports of the
+    same run do not overwrite each other.
+        Inputs:
+            file (string): file name, including extension, of a DB or CCIA file
+            import_function (function): import_DB or import_LGR
+            **kwargs: keyword arguments of import_function, see load_cached
+        Outputs:
+            data_path (string): file holding the parsed dataframe
+            key_path (string): JSON file holding the key the cached dataframe was built from
+    '''
+    variant = json.dumps([import_function.__name__, kwargs], sort_keys=True, default=str)
+    stem = file + '.' + hashlib.blake2b(variant.encode(), digest_size=4).hexdigest() + '.cache'
+    extension = '.parquet' if CACHE_FORMAT == 'parquet' else '.pkl'
+
+    return stem + extension, stem + '.json'
+
+@timed
+def load_cached(file, import_function, columns=None, **kwargs):
+    '''
+    Load a parsed DB or CCIA run from its columnar cache, rebuilding the cache first if the source file changed.
+    The cache is keyed on the path, size, modification time and content hash of the source file, plus the
+    import function and its keyword arguments, and each import function and set of keyword arguments is kept in
+    its own cache files, see cache_paths. When size and mtime match the stored key the hash is not 
+    recomputed; if they differ but the hash still matches (e.g. the file was only touched) the key is refreshed
+    without reparsing.
+        Inputs:
+            file (string): file name, including extension, of a DB or CCIA file
+            import_function (function): import_DB or import_LGR, used to parse the file when the cache is stale
+            columns (list of strings): optional list of columns to read from the cache, e.g. 
+                ['Time', '[CO2]_ppm', 'd13C']. The Time column is always read. Default None reads all columns
+            **kwargs: keyword arguments passed on to import_function
+        Outputs:
+            df (dataframe): the parsed dataframe, the same as import_function(file, **kwargs)
+    '''
+    data_path, key_path = cache_paths(file, import_function, **kwargs)
+    stat = os.stat(file)
+    key = {
+        'path': os.path.abspath(file),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'function': import_function.__name__,
+        'kwargs': json.loads(json.dumps(kwargs, default=str)),
+        'format': CACHE_FORMAT,
+    }
+    fresh = False
+    if os.path.exists(data_path) and os.path.exists(key_path):
+        with open(key_path) as f:
+            stored_key = json.load(f)
+        stored_hash = stored_key.pop('hash', None)
+        stored_columns = stored_key.pop('columns', None)
+        if stored_key == key:
+            fresh = True
+            key['hash'] = stored_hash
+        else:
+            #Size or mtime changed, so only the content hash can tell whether the data changed
+            key['hash'] = _file_hash(file)
+            stat_fields = ('size', 'mtime', 'hash')
+            same_source = {k: v for k, v in stored_key.items() if k not in stat_fields} == \
+                {k: v for k, v in key.items() if k not in stat_fields}
+            if same_source and stored_hash == key['hash']:
+                fresh = True
+                with open(key_path, 'w') as f:
+                    json.dump(dict(key, columns=stored_columns), f)
+
+    if not fresh:
+        debug('Rebuilding cache for', file)
+        df = import_function(file, **kwargs)
+        if CACHE_FORMAT == 'parquet':
+            df.to_parquet(data_path)
+        else:
+            df.to_pickle(data_path)
+        if 'hash' not in key:
+            key['hash'] = _file_hash(file)
+        stored_columns = df.columns.tolist()
+        with open(key_path, 'w') as f:
+            json.dump(dict(key, columns=stored_columns), f)
+
+    #As in the import functions, Time is always kept and requested columns missing from the file are skipped
+    if columns is not None:
+        columns = [name for name in stored_columns if name == 'Time' or name in columns]
+    if not fresh:
+        if columns is not None:
+            df = df[columns]
+        return df
+
+    debug('Loading', file, 'from cache')
+    if CACHE_FORMAT == 'parquet':
+        df = pd.read_parquet(data_path, columns=columns)
+    else:
+        df = pd.read_pickle(data_path)
+        if columns is not None:
+            df = df[columns]
+
+    return df
+
+def run_id(file):
+    '''
+    Name used as the key of a run in import_runs. For Dirtburner files this is the run number, e.g. DB-2274 for
+    DB-2274-20230210.txt, for other files it is the file name without directory or extension.
+    '''
+    name = os.path.splitext(os.path.basename(file))[0]
+    match = re.match(r'DB-\d+', name)
+
+    return match.group(0) if match else name
+
+def _import_run(file, columns, compact, cache):
+    '''Import one DB or CCIA file, choosing the import function from the file name. Used by import_runs.'''
+    import_function = import_DB if os.path.basename(file).startswith('DB-') else import_LGR
+
+    return import_function(file, columns=columns, compact=compact, cache=cache)
+
+@timed
+def import_runs(runs, columns=None, compact=False, cache=False, max_workers=None, concat=False):
+    '''
+    Import several DB and CCIA files in parallel with a pool of worker processes. Files whose names start with
+    DB- are read with import_DB, all others with import_LGR.
+        Inputs:
+            runs (list of strings or dictionary): file names, including extension, of the runs to import, or a 
+                dictionary of run ID to file name. For a list the run IDs come from the run_id function
+            columns (list of strings): passed on to the import functions, see import_LGR. Default None
+            compact (boolean): passed on to the import functions, see import_LGR. Default is False
+            cache (boolean): passed on to the import functions, see load_cached. Default is False
+            max_workers (int): largest number of files parsed at once. Default None uses one worker per CPU, and
+                1 imports the files one after another in this process
+            concat (boolean): if True, return a single dataframe with a Run column instead of a dictionary.
+                Default is False
+        Outputs:
+            run_dfs (dictionary of dataframes): dataframe of each run, keyed by run ID in the order of runs. A single
+                concatenated dataframe if concat is True
+    '''
+    if not isinstance(runs, dict):
+        runs = {run_id(file): file for file in runs}
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(runs))
+
+    if max_workers <= 1:
+        run_dfs = {key: _import_run(file, columns, compact, cache) for key, file in runs.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                key: executor.submit(_import_run, file, columns, compact, cache) for key, file in runs.items()
+            }
+            run_dfs = {key: future.result() for key, future in futures.items()}
+
+    if concat:
+        return pd.concat(run_dfs, names=['Run', None]).reset_index(level='Run')
+
+    return run_dfs
+
+class LogTail:
+    '''
+    Incremental reader for a CCIA or DB file that is still being written. The reader remembers the byte offset
+    of the last complete line it parsed, so each call to read only parses the rows appended since the previous
+    call and the cost of a refresh does not grow with the size of the file.
+
+    Example:
+        ccia_tail = LogTail('ccia_28Mar2023_f0000.txt', import_LGR)
+        new_rows = ccia_tail.read()
+
+        Inputs:
+            file (string): file name, including extension, of the growing DB or CCIA file
+            import_function (function): import_DB or import_LGR, selects the file format
+            keep_subseconds (boolean): passed on to the LGR timestamp parsing, see import_LGR. Default is False
+    '''
+
+    def __init__(self, file, import_function, keep_subseconds=False):
+        if import_function not in (import_DB, import_LGR):
+            raise ValueError('import_function must be import_DB or import_LGR')
+        self.file = file
+        self.import_function = import_function
+        self.keep_subseconds = keep_subseconds
+        self.offset = 0
+        self.names = DB_COLUMNS if import_function is import_DB else None
+        #Set once the PGP footer of a CCIA file has been reached, nothing is appended to the data after that
+        self.finished = False
+
+    def read(self):
+        '''
+        Parse the complete rows appended to the file since the last call.
+            Outputs:
+                chunk (dataframe): the new rows, in the same layout as the output of import_DB or import_LGR. Empty
+                    if nothing new has been written; before the header of a CCIA file is written it only has the
+                    Time column
+        '''
+        raw = b''
+        if not self.finished:
+            with open(self.file, 'rb') as f:
+                f.seek(self.offset)
+                raw = f.read()
+        #Only parse up to the last newline, a partially written row is picked up on the next call
+        raw = raw[:raw.rfind(b'\n') + 1]
+        if self.names is None:
+            #The first two lines of a CCIA file are the start date and the header
+            if raw.count(b'\n') < 2:
+                raw = b''
+            else:
+                self.names = _LGR_header_names(raw)
+                header_end = raw.index(b'\n', raw.index(b'\n') + 1) + 1
+                self.offset += header_end
+                raw = raw[header_end:]
+        if self.import_function is import_LGR:
+            data_end = find_LGR_footer(raw)
+            if data_end < len(raw):
+                self.finished = True
+            raw = raw[:data_end]
+        self.offset += len(raw)
+        debug('Read', len(raw), 'new bytes from', self.file, ', offset is now', self.offset)
+
+        if self.names is None:
+            #No header yet, so there are no rows either. The Time column is still datetime, as in every other chunk
+            return pd.DataFrame({'Time': pd.to_datetime([])})
+        if self.import_function is import_DB:
+            if raw:
+                chunk = pd.read_csv(io.BytesIO(raw), delimiter='\t', header=None, names=DB_COLUMNS)
+            else:
+                chunk = pd.DataFrame({name: np.array([], dtype=float) for name in DB_COLUMNS})
+            chunk = convert_dates(chunk)
+        else:
+            if raw:
+                chunk = pd.read_csv(io.BytesIO(raw), header=None, names=self.names)
+            else:
+                #Give the empty columns the dtypes import_LGR would parse, so concatenating chunks keeps them
+                dtypes = {name: str if name.strip() in ('Time',) + LGR_TEXT_COLUMNS else
+                          'int64' if name.strip() in LGR_INTEGER_COLUMNS else float for name in self.names}
+                chunk = pd.DataFrame({name: pd.Series([], dtype=dtypes[name]) for name in self.names})
+            chunk = _convert_LGR_times(chunk, self.keep_subseconds)
+
+        return chunk
+
+    def follow(self, poll_interval=5):
+        '''
+        Generator that polls the file and yields each non-empty chunk of new rows. Stops when the PGP footer of
+        a CCIA file is reached; DB files have no footer, so stop iterating yourself.
+            Inputs:
+                poll_interval (float): seconds to wait between polls when nothing new has been written
+        '''
+        while True:
+            chunk = self.read()
+            if len(chunk) > 0:
+                yield chunk
+            elif self.finished:
+                return
+            else:
+                time.sleep(poll_interval)
+
+@timed
 def convert_dates(df):
     '''Convert the dates in date_tiem column from LabView to EST.
     '''
@@ -73,105 +483,222 @@ def convert_dates(df):
 
     return df
 
-def view_concentrations(ccia_df, db_df, begin_timestamp, end_timestamp, time_offset):
+def _sort_by_time(df):
+    '''Return df sorted on the Time column, which time_window relies on. Already sorted runs are returned as they are.'''
+    if not df['Time'].is_monotonic_increasing:
+        debug('Rows are out of time order, sorting on Time')
+        df = df.sort_values('Time', kind='stable', ignore_index=True)
+
+    return df
+
+def time_window(df, begin_timestamp, end_timestamp):
     '''
-    Initial data view comparison of the [CO2] data in the dirtburner and in the LRG CCIA.
-    This function takes the two dataframes, two timestamps marking the beginning and end of 
-    the data gathering period, and plots the data in a 3-panel plot. The time offset is for 
-    adjusting the time if the computers are registering different times for the duration of the runs
+    Select the rows of a run strictly between two timestamps. The Time column of runs loaded with import_DB or
+    import_LGR is sorted, so the window edges are found by binary search and the result is a slice of df
+    rather than a copy made through a boolean mask.
+        Inputs:
+            df (dataframe): output of import_DB or import_LGR, sorted on the Time column
+            begin_timestamp (pandas timestamp or string): beginning of the window, format 'YYYY-mm-dd HH:MM:SS'.
+                None leaves the window open at the beginning
+            end_timestamp (pandas timestamp or string): end of the window, format 'YYYY-mm-dd HH:MM:SS'. None 
+                leaves the window open at the end
+        Outputs:
+            window_df (dataframe): rows of df with begin < Time < end
+    '''
+    return time_windows(df, [(begin_timestamp, end_timestamp)])[0]
 
+@timed
+def time_windows(df, timestamps):
+    '''
+    Select many time windows from one run at once, e.g. all of the reaction phases from a run sheet. All window
+    edges are located with a single vectorized binary search over the sorted Time column.
+        Inputs:
+            df (dataframe): output of import_DB or import_LGR, sorted on the Time column
+            timestamps (list of tuples of strings): List of tuples, each containing the begin time and end time of 
+                a window. Format should be 2023-02-10 09:52:00 (YYYY-MM-DD HH:mm:SS). None leaves that side open
+        Outputs:
+            window_dfs (list of dataframes): for each tuple in timestamps, the rows of df with begin < Time < end
+    '''
+    times = df['Time']
+    #Round the edges onto the resolution of the Time column so the search does not have to convert the column
+    resolution = pd.Timedelta(1, unit=times.dt.unit)
+    #Convert each edge on its own, hand-typed run sheet times do not all share one layout
+    begins = pd.DatetimeIndex([pd.NaT if w[0] is None else pd.Timestamp(w[0]) for w in timestamps])
+    ends = pd.DatetimeIndex([pd.NaT if w[1] is None else pd.Timestamp(w[1]) for w in timestamps])
+    begins = begins.floor(resolution).as_unit(times.dt.unit)
+    ends = ends.ceil(resolution).as_unit(times.dt.unit)
+    starts = np.zeros(len(timestamps), dtype=int)
+    stops = np.full(len(timestamps), len(df))
+    starts[begins.notna()] = times.searchsorted(begins[begins.notna()], side='right')
+    stops[ends.notna()] = times.searchsorted(ends[ends.notna()], side='left')
+    window_dfs = [df.iloc[start:max(start, stop)] for start, stop in zip(starts, stops)]
+
+    return window_dfs
+
+def elapsed_seconds(df):
+    '''
+    Seconds elapsed since the first row of a run or time window. Computed as one subtraction on the datetime
+    array, so no per-row Timedelta objects are made and nothing is written into df.
         Inputs:
-            ccia_df (dataframe) - the output of the import_LGR function. A dataframe with 105 columns rows 
-                from approximately every second of data acquisition.
-            db_df (dataframe) - the output of the import_DB function. A dataframe with 7 columns and rows
-                from approxaimtely every second of data acquisition.
-            begin_timestamp (pandas timestamp) - a string in the format 'YYYY-mm-dd HH:MM' to mark the beginning
-                of the experiment
-            end_timestamp (pandas timestamp) - a string in the format 'YYYY-mm-dd HH:MM' to mark the end
-                of the experiment
-            time_offset (floating point number) - The number of hours of offset there is between the CCIA and 
-                DB computer, if there is any offset. Good laboratory practice would be to ensure that there is 
-                no offset, however this allows you to adjust for instance, if you have to reboot the linux system
-                controlling the LGR CCIA system.
-        
+            df (dataframe): dataframe with a Time column, e.g. the output of time_window
         Outputs:
-            ax1 (matplotlib axes handle) - this is the handle returned so that you can make changes to the axes
-                (axis labels, fonts, etc.) after using the function. There are three axes, 0 is the top and 2 
-                is the bottom
+            elapsed (numpy array of floats): seconds since df['Time'].iloc[0], one value per row
+    '''
+    times = df['Time'].to_numpy()
+    if len(times) == 0:
+        return np.array([], dtype=float)
+    elapsed = (times - times[0]) / np.timedelta64(1, 's')
 
+    return elapsed
 
+def decimate_indices(y, max_points):
     '''
-    #Mask the dataframes to isolate only the data that the viewer wants to view. 
-    begin = pd.to_datetime(begin_timestamp)
-    end = pd.to_datetime(end_timestamp)
-    ccia_run_df = ccia_df.loc[(ccia_df['Time']>begin) & (ccia_df['Time']<end)]
-    db_run_df = db_df.loc[(db_df['Time']>begin) & (db_df['Time']<end)]
-    
-    del_time = pd.Timedelta(hours=time_offset) #This accounts for any difference in times between the computers.
-    fig1, ax1 = plt.subplots(nrows=3, ncols=1, sharex=True)
-    ax1[0].plot(ccia_run_df['Time'] - del_time, ccia_run_df['[CO2]_ppm'])
-    ax1[0].set(title='LGR')
-    ax1[1].plot(db_run_df['Time'], db_run_df['pCO2'], color='peru')
-    ax1[1].set(title='DB')
-    plt.xticks(rotation=30, ha='right')
-    ax1[2].plot(ccia_run_df['Time'] - del_time, ccia_run_df['[CO2]_ppm'])
-    ax1[2].plot(db_run_df['Time'], db_run_df['pCO2'], color='peru')
-
-    ax1[2].set(xlabel='Time', title='DB and LGR')
-    big_ax1 = fig1.add_subplot(111, frameon=False)
-    plt.tick_params(labelcolor='none', which='both', top=False, bottom=False, left=False, right=False)
-    big_ax1.set(ylabel=r'pCO$_{2}$, ppm')
+    Choose the rows of a series to plot when it has more points than the figure can show. The series is cut
+    into equal buckets and the rows of the minimum and maximum of each bucket are kept, along with the first
+    and last rows, so peaks and dips keep their height and shape on screen.
+        Inputs:
+            y (array-like of floats): the data that will be plotted on the y axis
+            max_points (int): largest number of rows to keep
+        Outputs:
+            rows (numpy array of ints): sorted positions of the rows to plot
+    '''
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(max_points // 2, 1))
+    n_buckets = -(-n // size)
+    #Pad the last bucket with its own last value so the series can be reshaped into equal buckets
+    buckets = np.concatenate([y, np.full(n_buckets*size - n, y[-1])]).reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    rows = np.concatenate([[0, n - 1], offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1)])
+
+    return np.unique(np.minimum(rows, n - 1))
+
+@timed
+def find_time_lag(ccia_df, db_df, begin_timestamp=None, end_timestamp=None, resolution=1, max_lag=3600):
+    '''
+    Estimate the time lag between the Dirtburner and LGR CCIA [CO2] records. Both records are resampled onto a
+    common time grid and the lag is the peak of their FFT cross-correlation, which takes O(n log n) time. The 
+    lag includes the transit time of the gas from the DB analyzer to the LGR as well as any clock offset 
+    between the computers.
+        Inputs:
+            ccia_df (dataframe): output of the import_LGR function
+            db_df (dataframe): output of the import_DB function
+            begin_timestamp (pandas timestamp or string): optional beginning of the period to compare, format 
+                'YYYY-mm-dd HH:MM:SS'. Default None uses the whole of both records, which must overlap in time
+            end_timestamp (pandas timestamp or string): optional end of the period to compare. Default None
+            resolution (float): spacing of the common time grid, in seconds. Default is 1
+            max_lag (float): largest lag, in seconds, to search in either direction. Default is 3600
+        Outputs:
+            lag (float): seconds by which the LGR record trails the DB record. lag/3600 is the time_offset to 
+                use in view_concentrations
+    '''
+    ccia_run_df = time_window(ccia_df, begin_timestamp, end_timestamp)
+    db_run_df = time_window(db_df, begin_timestamp, end_timestamp)
+    if len(ccia_run_df) < 2 or len(db_run_df) < 2:
+        raise ValueError('Both records need at least two rows in the selected period to find a time lag')
+    if ccia_run_df['Time'].iloc[0] >= db_run_df['Time'].iloc[-1] or \
+            ccia_run_df['Time'].iloc[-1] <= db_run_df['Time'].iloc[0]:
+        raise ValueError('The LGR and DB records do not overlap, check that the files are from the same run')
+
+    #Resample each record onto its own grid with the same spacing, and standardize them so the correlation does
+    #not depend on the baselines. Outside of each record the padding is zero, nothing is extrapolated
+    series = []
+    for run_df, column in ((db_run_df, 'pCO2'), (ccia_run_df, '[CO2]_ppm')):
+        seconds = (run_df['Time'] - run_df['Time'].iloc[0]).dt.total_seconds().to_numpy()
+        grid = np.arange(0, seconds[-1] + resolution/2, resolution)
+        values = np.interp(grid, seconds, run_df[column].to_numpy(dtype=float))
+        series.append((values - values.mean())/(values.std() or 1))
+    db_co2, ccia_co2 = series
+
+    #corr[k] is the sum of db_co2[i]*ccia_co2[i+k], padded so the circular correlation does not wrap around
+    nfft = 1 << (len(db_co2) + len(ccia_co2) - 1).bit_length()
+    corr = np.fft.irfft(np.conj(np.fft.rfft(db_co2, nfft)) * np.fft.rfft(ccia_co2, nfft), nfft)
+    #A shift of k grid points is a lag of start_offset + k*resolution seconds
+    start_offset = (ccia_run_df['Time'].iloc[0] - db_run_df['Time'].iloc[0]).total_seconds()
+    shifts = np.arange(
+        max(np.ceil((-max_lag - start_offset)/resolution), -(len(db_co2) - 1)),
+        min(np.floor((max_lag - start_offset)/resolution), len(ccia_co2) - 1) + 1
+    ).astype(int)
+    best = np.argmax(corr[shifts % nfft])
+    #A best match on the edge of the searched range is only the bound, the real peak lies beyond it
+    if best == 0 or best == len(shifts) - 1:
+        raise ValueError('The best correlation is at the edge of the searched lags, increase max_lag or check that '
+                         'the files are from the same run')
+    lag = start_offset + shifts[best] * resolution
+    debug('Time lag of LGR behind DB is', lag, 's')
+
+    return float(lag)
+
+@timed
+def align_concentrations(ccia_df, db_df, lag=None, tolerance=1, ccia_columns=None, **kwargs):
+    '''
+    Merge the LGR CCIA and Dirtburner records into one dataframe after removing the time lag between them. 
+    Each LGR row, shifted back by the lag, is matched with the nearest DB row using merge_asof.
+        Inputs:
+            ccia_df (dataframe): output of the import_LGR function
+            db_df (dataframe): output of the import_DB function
+            lag (float): seconds by which the LGR record trails the DB record. Default None estimates it with
+                find_time_lag
+            tolerance (float): largest difference, in seconds, between matched rows. LGR rows with no DB row 
+                this close get NaN for the DB columns. Default is 1
+            ccia_columns (list of strings): optional list of LGR columns to keep. Default None keeps all columns
+            **kwargs: keyword arguments passed on to find_time_lag when lag is None, e.g. begin_timestamp
+        Outputs:
+            aligned_df (dataframe): one row per LGR row, on the DB time axis, with the LGR and DB columns side by side
+    '''
+    if lag is None:
+        lag = find_time_lag(ccia_df, db_df, **kwargs)
+    if ccia_columns is not None:
+        ccia_df = ccia_df[['Time'] + [name for name in ccia_columns if name != 'Time']]
+    db_df = db_df.assign(Time=db_df['Time'].astype(ccia_df['Time'].dtype))
+    ccia_shifted_df = ccia_df.assign(Time=ccia_df['Time'] - pd.Timedelta(seconds=lag))
+    aligned_df = pd.merge_asof(
+        ccia_shifted_df,
+        db_df,
+        on='Time',
+        direction='nearest',
+        tolerance=pd.Timedelta(seconds=tolerance),
+        suffixes=('_LGR', '_DB')
+    )
 
-    return ax1
+    return aligned_df
 
-def compare_CCIA(runs, timestamps, colors, legend_labels, column_name='d13C'):
+def frac_calc_array(CO2_conc, bkgnd_conc):
     '''
-    Function to compare different CCIA runs. User chooses colors, run files, timestamps, and column to plot. Function
-    computes elapsed time for each run and plots on time axis. DB data files are not used, this should only be pointed 
-    at CCIA files. 
+    Vectorized version of frac_calc. Calculates the fraction of sample for a whole run in one pass.
+        Inputs:
+            CO2_conc (array-like of floats): the concentration data from the LGR-CCIA
+            bkgnd_conc (float, constant): the concentration of CO2 that represents no sample gas mixed in, generally the minimum of the 
+                concentration from the LGR-CCIA data
+        Outputs:
+            frac_sam (numpy array of floats): numbers between 0 and 1 representing the proportion of sample
+    '''
+    CO2_conc = np.asarray(CO2_conc, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac_sam = (CO2_conc-bkgnd_conc)/CO2_conc
 
+    return frac_sam
+
+def delta_calc_array(delta_meas, baseline, f_sam):
+    '''
+    Vectorized version of delta_calc. Calculates the delta value of the sample for a whole run in one pass. Where
+    f_sam <= 0 the sample delta is set to the baseline, as in delta_calc.
         Inputs:
-            runs (list of strings): List of file names, including extension, of the files (runs) you want to compare
-            timestamps (list of tuples of strings): List of tuples, each containing the begin time and end time of a reaction
-                entered as strings. Format should be 2023-02-10 09:52:00 (YYYY-MM-DD HH:mm:SS). 
-            colors (list of strings): Strings for named colors in python Matplotlib
-            legend_labels (list of strings): String to describe each run as you want in the figure legend.
-            col (string): column you wish to plot. Columns must match those available in call to df.columns function, or will default
-                to plotting the d13C column
-    '''
-
-    fig, ax = plt.subplots(nrows=1, ncols=1)
-    label_list = []
-    for j, run in enumerate(runs):
-        #import each run
-        df = import_LGR(run)
-        if column_name not in df.columns:
-            print('!! Specified column, ', column_name, ', is not in ', run, '. Defaulting to plot of d13C vs. elapsed time for this run. !!')
-            plot_column = 'd13C'
-        else:
-            plot_column = column_name
-        #set up begin and end
-        begin = pd.to_datetime(timestamps[j][0]) 
-        end = pd.to_datetime(timestamps[j][1])
-        masked_df = df.loc[(df['Time']>begin) & (df['Time']<end)]
-        #Calculate elapsed time
-        masked_df.loc[:, 'Elapsed Time'] = [pd.Timedelta(time-masked_df['Time'].iloc[0], unit='seconds').total_seconds() for time in masked_df['Time']]
-        ax.plot(masked_df['Elapsed Time'], masked_df[plot_column], color=colors[j])
-        #Create legend label list
-        label_list.append(mlines.Line2D([], [], color=colors[j], label=legend_labels[j]))
-
-    #Choose column name:
-    if column_name == 'd13C':
-        y_label = r'$\delta^{13}$C, relative'
-    elif column_name == '[CO2]_ppm':
-        y_label = r'[CO$_{2}$], ppm'
-    else:
-        y_label = column_name
-    ax.set_xlabel('Elapsed time, s')
-    ax.set_ylabel(y_label)
-    plt.legend(handles=label_list)
-    
-    return ax
+            delta_meas (array-like of floats): isotope data from the LGR-CCIA data file
+            baseline (float, constant): assumed or measured stable isotope value of the carrier gas
+            f_sam (array-like of floats): output of frac_calc_array, fraction of the sample in the [CO2] concentration
+        Outputs: delta_sam (numpy array of floats): calculated delta values of the sample mixed with the carrier gas 
+    '''
+    delta_meas = np.asarray(delta_meas, dtype=float)
+    f_sam = np.asarray(f_sam, dtype=float)
+    no_sample = f_sam <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_sam = (delta_meas - baseline)/f_sam - baseline
+    delta_sam = np.where(no_sample, baseline, delta_sam)
+
+    return delta_sam
 
 def frac_calc(CO2_conc, bkgnd_conc):
     '''
@@ -183,7 +710,9 @@ def frac_calc(CO2_conc, bkgnd_conc):
         Outputs:
             frac_sam (float): number between 0 and 1 representing the proportion of sample
     '''
-    frac_sam = (CO2_conc-bkgnd_conc)/CO2_conc
+    frac_sam = frac_calc_array(CO2_conc, bkgnd_conc)
+    if frac_sam.ndim == 0:
+        frac_sam = float(frac_sam)
 
     return frac_sam
 
@@ -197,65 +726,258 @@ def delta_calc(delta_meas, baseline, f_sam):
             f_sam (float): output of frac_calc function, fraction of the sample in the [CO2] concentration
         Outputs: delta_sam (float): calculated delta value of the sample mixed with the carrier gas 
     '''
-    if f_sam <= 0:
-        delta_sam = baseline
-    else:
-        delta_sam = (delta_meas - baseline)/f_sam - baseline
+    delta_sam = delta_calc_array(delta_meas, baseline, f_sam)
+    if delta_sam.ndim == 0:
+        delta_sam = float(delta_sam)
 
     return delta_sam
 
-def isotope_concentration_plot(df, delta_baseline, delta_meas_uncertainty, delta_calc_threshold, timestamps, color_map='plasma', null_color='k'):
-    '''
-    Plots a concentration vs. time plot, and colors the points with calculated isotope values. The calculation of 
-    isotope values depends on an assumption that the minimum concentration of the run is the baseline value
-    and any elevation in [CO2] is due to admixture of the sample. The calculation involves the fraction of sample
-    in the denominator, so at low values (just above baseline), the calculated isotope values can be 
-    erroneously high. To avoid this, the function asks you to enter the uncertainty on isotope measurements
-    as well as what uncertainty you are willing to work with on the calculation. The lower the concentration, the
-    higher the uncertainty with this instrument. The value you pick for delta_calc_threshold would be positive,
-    and always moe than delta_meas_uncertainty. The closer these values are to one another, the more
-    data will be masked black. 
+def estimate_baseline(conc, window=601):
+    '''
+    Estimate a slowly varying [CO2] baseline under the peaks of a run. A rolling minimum followed by a rolling 
+    maximum of the same width (a morphological opening) removes every feature narrower than the window, and
+    a rolling median smooths what is left. This follows drift in the carrier gas that a single global minimum
+    of the concentration cannot.
+        Inputs:
+            conc (array-like of floats): [CO2] data, e.g. df['[CO2]_ppm']
+            window (int): width of the rolling windows in rows (seconds at 1 Hz). Must be wider than the peaks.
+                Default is 601
+        Outputs:
+            baseline (numpy array of floats): baseline concentration for each row
+    '''
+    conc = pd.Series(np.asarray(conc, dtype=float))
+    baseline = conc.rolling(window, center=True, min_periods=1).min()
+    baseline = baseline.rolling(window, center=True, min_periods=1).max()
+    baseline = baseline.rolling(window, center=True, min_periods=1).median()
+
+    return np.minimum(baseline.to_numpy(), conc.to_numpy())
+
+def find_peaks(df, window=601, min_height=None, min_width=10, min_gap=5):
+    '''
+    Find the peaks in the [CO2] record of a run. A row is part of a peak when its concentration is above the
+    baseline from estimate_baseline by more than min_height. Runs of such rows closer than min_gap rows are
+    joined, and runs shorter than min_width rows are dropped.
+        Inputs:
+            df (dataframe): dataframe loaded from the import_LGR function, or a time_window of one
+            window (int): baseline window in rows, see estimate_baseline. Default is 601
+            min_height (float): smallest excess over the baseline, in ppm, that counts as a peak. Default None 
+                uses 5 times the robust noise level of the excess
+            min_width (int): smallest number of rows in a peak. Default is 10
+            min_gap (int): peaks separated by fewer rows than this are merged. Default is 5
+        Outputs:
+            bounds (numpy array of ints): one row per peak with the index of the first row and one past the 
+                last row of the peak, as positions in df
+            baseline (numpy array of floats): the baseline concentration for each row of df
+    '''
+    conc = df['[CO2]_ppm'].to_numpy(dtype=float)
+    baseline = estimate_baseline(conc, window)
+    excess = conc - baseline
+    if min_height is None:
+        noise = 1.4826 * np.median(np.abs(excess - np.median(excess))) if len(excess) else 0
+        min_height = 5 * noise
+    in_peak = np.concatenate([[False], excess > min_height, [False]])
+    edges = np.flatnonzero(np.diff(in_peak.astype(np.int8)))
+    starts, stops = edges[0::2], edges[1::2]
+    #Merge peaks that are separated by short dips below the threshold
+    if len(starts) > 1:
+        keep = np.concatenate([[True], starts[1:] - stops[:-1] >= min_gap])
+        starts = starts[keep]
+        stops = stops[np.concatenate([keep[1:], [True]])]
+    wide = stops - starts >= min_width
+    bounds = np.column_stack([starts[wide], stops[wide]]).astype(int)
+    debug('Found', len(bounds), 'peaks')
+
+    return bounds, baseline
+
+@timed
+def peak_summary(df, delta_baseline, window=601, min_height=None, min_width=10, min_gap=5):
+    '''
+    Detect the peaks of a run with find_peaks and integrate each one. The sample isotope value of a peak is the
+    mean of delta_calc_array over the peak weighted by the excess concentration, with the sample fraction from
+    frac_calc_array against the local baseline.
         Inputs:
-            df (dataframe): Dataframe loaded from the import_LGR function
-            delta_meas_uncertainty (float): Assumed or known uncertainty on an isotope measurement of the LGR-CCIA
-            delta_calc_threshold (float): Your level of acceptable uncertainty (in permil) of the calculated 
-                isotope value of the sample. 
-            timestamps (tuple of strings): a tuple in the form of (begin, end) where both beginning and end
-                are strings in the format of YYYY-MM-DD HH:mm:SS
-            color_map (matplotlib color map, string): a string representing the desired existing colormap
-                recognized by matplotlib.pyplot. Default is plasma
-            null_color (single matplotlib color string): string representing a single named color in Python
-                This color will mark the points that have uncertainties beyond your threshold. Default = k
-        
-
-    '''
-    #Add columns to the dataframes for both the fraction (first function above) and the delta value of the sample (second function)
-    min_conc = min(df['[CO2]_ppm'])
-    fraction_list = [frac_calc(a, min_conc) for a in df['[CO2]_ppm']]
-    df.loc[:,['frac_sam']] = fraction_list
-    delta_list = [delta_calc(a, delta_baseline, b) for a, b in zip(df['d13C'], df['frac_sam'])]
-    df.loc[:,['delta_sam']] = delta_list
-    #Calculate elapsed time and make new column
-    begin = pd.to_datetime(timestamps[0]) 
-    end = pd.to_datetime(timestamps[1])
-    masked_df = df.loc[(df['Time']>begin) & (df['Time']<end)]
-    masked_df.loc[:, 'Elapsed Time'] = [pd.Timedelta(time-masked_df['Time'].iloc[0], unit='seconds').total_seconds() for time in masked_df['Time']]
-
-    #Split dataframe into that which can be plotted as an isotope value, and that which cannot
-    iso_df = masked_df.loc[delta_meas_uncertainty/df['frac_sam']<delta_calc_threshold]
-    debug(iso_df['frac_sam'].shape)
-    no_iso_df = masked_df.loc[delta_meas_uncertainty/df['frac_sam']>=delta_calc_threshold]
-    debug(no_iso_df['frac_sam'].shape)
-    df_out = df
-
-    #Plot concentrations, colored with isotope values (values with uncertainties > delta_calc_threshold are black dots)
-    scat_fig, scat_ax = plt.subplots(nrows=1, ncols=1)
-    g = scat_ax.scatter(iso_df['Elapsed Time'], iso_df['[CO2]_ppm'], s=10, c=iso_df['delta_sam'], cmap=color_map)
-    scat_ax.plot(no_iso_df['Elapsed Time'], no_iso_df['[CO2]_ppm'], marker='.', mec=null_color, linestyle='', mfc='None')
-    #scat_ax.annotate(r'Carrier gas $\delta^{13}$C = ' + str(delta_baseline) + '/n', )
-    cbar = scat_fig.colorbar(g)
-    scat_ax.set_ylabel(r'[CO$_{2}$], ppm')
-    scat_ax.set_xlabel('Elapsed time, s')
-    cbar.set_label(r'$\delta^{13}$C, calculated')
-
-    return scat_ax, cbar, df_out
+            df (dataframe): dataframe loaded from the import_LGR function, or a time_window of one
+            delta_baseline (float): assumed or measured stable isotope value of the carrier gas
+            window, min_height, min_width, min_gap: peak detection settings, see find_peaks
+        Outputs:
+            summary_df (dataframe): one row per peak with the columns Start, End and Peak (timestamps), 
+                Rows, Max [CO2]_ppm, Area_ppm_s (excess concentration integrated over time) and delta_sam 
+                (concentration-weighted sample d13C)
+    '''
+    bounds, baseline = find_peaks(df, window, min_height, min_width, min_gap)
+    starts, stops = bounds[:, 0], bounds[:, 1]
+    times = df['Time'].to_numpy()
+    conc = df['[CO2]_ppm'].to_numpy(dtype=float)
+    excess = conc - baseline
+    delta_sam = delta_calc_array(df['d13C'], delta_baseline, frac_calc_array(conc, baseline))
+
+    #Running sums turn the integral and weighted mean of every peak into differences at the peak bounds
+    seconds = elapsed_seconds(df)
+    area = np.concatenate([[0], np.cumsum((excess[1:] + excess[:-1])/2 * np.diff(seconds))])
+    weight = np.concatenate([[0], np.cumsum(excess)])
+    weighted_delta = np.concatenate([[0], np.cumsum(excess * delta_sam)])
+    peak_rows = [start + np.argmax(conc[start:stop]) for start, stop in bounds]
+    summary_df = pd.DataFrame({
+        'Start': times[starts],
+        'End': times[stops - 1],
+        'Peak': times[peak_rows],
+        'Rows': stops - starts,
+        'Max [CO2]_ppm': conc[peak_rows],
+        'Area_ppm_s': area[stops - 1] - area[starts],
+        'delta_sam': (weighted_delta[stops] - weighted_delta[starts])/(weight[stops] - weight[starts]),
+    })
+
+    return summary_df
+
+@timed
+def summarize_runs(runs, delta_baseline, max_workers=None, cache=False, **kwargs):
+    '''
+    Peak summary of many CCIA runs, e.g. every archived run. The files are loaded with import_runs and 
+    peak_summary is applied to each.
+        Inputs:
+            runs (list of strings or dictionary): CCIA file names or a dictionary of run ID to file name, see import_runs
+            delta_baseline (float): assumed or measured stable isotope value of the carrier gas
+            max_workers (int): number of files imported at once, see import_runs. Default None
+            cache (boolean): load the files through the on-disk cache, see load_cached. Default is False
+            **kwargs: peak detection settings passed on to peak_summary
+        Outputs:
+            summary_df (dataframe): the peak_summary rows of all runs, with a Run column holding the run ID
+    '''
+    run_dfs = import_runs(runs, columns=['Time', '[CO2]_ppm', 'd13C'], cache=cache, max_workers=max_workers)
+    summaries = {key: peak_summary(df, delta_baseline, **kwargs) for key, df in run_dfs.items()}
+    summary_df = pd.concat(summaries, names=['Run', None]).reset_index(level='Run').reset_index(drop=True)
+
+    return summary_df
+
+
+def find_runs(paths):
+    '''
+    List the DB and CCIA files to process. Directories are searched for files named DB-*.txt and ccia_*.txt, 
+    other paths are taken as they are.
+        Inputs:
+            paths (list of strings): files and/or directories
+        Outputs:
+            files (list of strings): the DB and CCIA file names, sorted within each directory
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, 'DB-*.txt')) + glob.glob(os.path.join(path, 'ccia_*.txt')))
+        else:
+            files.append(path)
+
+    return files
+
+def _convert_run(file, out_dir, file_format, compact, delta_baseline):
+    '''Import, write out and summarize one DB or CCIA file. Used by convert_runs.'''
+    is_DB = os.path.basename(file).startswith('DB-')
+    df = _import_run(file, None, compact, False)
+    column = 'pCO2' if is_DB else '[CO2]_ppm'
+    summary = {
+        'Run': run_id(file),
+        'File': file,
+        'Type': 'DB' if is_DB else 'CCIA',
+        'Rows': len(df),
+        'Start': df['Time'].iloc[0] if len(df) else pd.NaT,
+        'End': df['Time'].iloc[-1] if len(df) else pd.NaT,
+        'Min CO2': df[column].min(),
+        'Mean CO2': df[column].mean(),
+        'Max CO2': df[column].max(),
+        'Output': None,
+    }
+    if out_dir is not None:
+        output = os.path.join(out_dir, run_id(file) + {'parquet': '.parquet', 'pickle': '.pkl', 'csv': '.csv'}[file_format])
+        if file_format == 'parquet':
+            df.to_parquet(output)
+        elif file_format == 'pickle':
+            df.to_pickle(output)
+        else:
+            df.to_csv(output, index=False)
+        summary['Output'] = output
+    peaks_df = None
+    if delta_baseline is not None and not is_DB:
+        peaks_df = peak_summary(df, delta_baseline)
+        summary['Peaks'] = len(peaks_df)
+
+    return summary, peaks_df
+
+@timed
+def convert_runs(files, out_dir=None, file_format=None, compact=False, delta_baseline=None, max_workers=None):
+    '''
+    Convert many DB and CCIA files to columnar files and summarize them, with a pool of worker processes. Only
+    the summaries are sent back from the workers, so memory use does not grow with the number of files.
+        Inputs:
+            files (list of strings): DB and CCIA file names, e.g. from find_runs
+            out_dir (string): directory to write the parsed dataframes to, one file per run named by run_id. 
+                Default None only summarizes
+            file_format (string): 'parquet', 'pickle' or 'csv'. Default None uses CACHE_FORMAT
+            compact (boolean): parse with float32 and categorical columns, see import_LGR. Default is False
+            delta_baseline (float): if given, peak_summary is run on each CCIA file with this carrier gas d13C
+            max_workers (int): largest number of files processed at once. Default None uses one worker per CPU
+        Outputs:
+            summary_df (dataframe): one row per file with its run ID, type, rows, start and end times, CO2 
+                statistics, output file and, with delta_baseline, number of peaks
+            peaks_df (dataframe): the peak_summary rows of all CCIA files with a Run column, or None when 
+                delta_baseline is None
+    '''
+    file_format = file_format or CACHE_FORMAT
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(files))
+    arguments = (out_dir, file_format, compact, delta_baseline)
+
+    if max_workers <= 1:
+        results = [_convert_run(file, *arguments) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_convert_run, files, *[[a] * len(files) for a in arguments]))
+
+    summary_df = pd.DataFrame([summary for summary, _ in results])
+    peaks_df = None
+    if delta_baseline is not None:
+        peaks = {summary['Run']: peaks for summary, peaks in results if peaks is not None}
+        peaks_df = pd.concat(peaks, names=['Run', None]).reset_index(level='Run').reset_index(drop=True) if peaks else None
+
+    return summary_df, peaks_df
+
+def main(argv=None):
+    '''
+    Command line entry point for headless batch jobs. Converts and summarizes DB and CCIA files, e.g.
+        python DB_LGR_py.py raw_logs/ --out converted/ --delta-baseline 13
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert and summarize Dirtburner (DB-*.txt) and LGR CCIA (ccia_*.txt) logs.')
+    parser.add_argument('paths', nargs='+', help='DB or CCIA files, or directories containing them')
+    parser.add_argument('--out', default=None, help='directory to write the converted runs to (default: summarize only)')
+    parser.add_argument('--format', default=CACHE_FORMAT, choices=['parquet', 'pickle', 'csv'],
+                        help='file format of the converted runs (default: %(default)s)')
+    parser.add_argument('--compact', action='store_true', help='store float32 and categorical columns')
+    parser.add_argument('--delta-baseline', type=float, default=None,
+                        help='carrier gas d13C; if given, detect and summarize the peaks of each CCIA file')
+    parser.add_argument('--workers', type=int, default=None, help='number of files processed at once (default: CPU count)')
+    parser.add_argument('--summary', default=None, help='write the summary table to this CSV file')
+    parser.add_argument('--debug', action='store_true', help='print debug and timing messages')
+    args = parser.parse_args(argv)
+
+    global DEBUG
+    DEBUG = args.debug
+    files = find_runs(args.paths)
+    if not files:
+        parser.error('no DB-*.txt or ccia_*.txt files found')
+    summary_df, peaks_df = convert_runs(files, args.out, args.format, args.compact, args.delta_baseline, args.workers)
+
+    print(summary_df.drop(columns=['File']).to_string(index=False))
+    if args.summary is not None:
+        summary_df.to_csv(args.summary, index=False)
+    if peaks_df is not None:
+        print()
+        print(peaks_df.to_string(index=False))
+        if args.out is not None:
+            peaks_df.to_csv(os.path.join(args.out, 'peaks.csv'), index=False)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
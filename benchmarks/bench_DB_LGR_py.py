@@ -0,0 +1,205 @@
+'''
+Benchmark suite for the DB_LGR_py pipeline. Synthetic Dirtburner and LGR CCIA files are written in the real
+formats (tab separated LabView epoch rows for the DB, the 105 column comma layout with a PGP footer for the
+CCIA) at sizes from minutes to weeks of 1 Hz data. Each stage of the pipeline is timed and the throughput
+(rows/s) and peak memory are reported.
+
+Run from the repository directory:
+    python benchmarks/bench_DB_LGR_py.py
+    python benchmarks/bench_DB_LGR_py.py --sizes 1h 1d 1w --repeat 3
+
+Set DB_LGR_py.DEBUG = True (or pass --debug) to also see the per-stage timing log of the module itself.
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import DB_LGR_py as dblgr
+
+#Rows of 1 Hz data for each named size
+SIZES = {'10min': 600, '1h': 3600, '1d': 86400, '1w': 7*86400, '2w': 14*86400}
+
+#Column names of a CCIA file: Time, 50 measured values each with a standard error, and 4 status columns
+_LGR_VALUES = [
+    '[ht12]_ppm', '[ht13]_ppm', '[ht18]_ppm', '[H2O]_ppm', '[CO2]_ppm', 'd13C', 'd18O', '[12CO2]_ppm',
+    '[13CO2]_ppm', '[18CO2]_ppm', '[CO2_dry]_ppm', '[C12O2_dry]_ppm', '[C13O2_dry]_ppm', '[C18O2_dry]_ppm',
+    '[CO2_sam]_ppm', 'GasP_torr', 'GasT_C', 'AmbT_C', 'RD0_us', 'DCS', 'Gnd', 'Gndstd', 'Sig', 'Sigstd',
+    'LTC0_b', 'LTC0_v', 'Peak0', 'Xaxis0', 'Xaxis1', 'Xaxis2', 'BL0T', 'BL1T', 'BL2F', 'BL3F',
+] + ['%s_%s' % (line, fit) for line in ('12CO2_0', '13CO2_1', 'H2O_2', '12C16O18O_3') for fit in ('CT', 'AT', 'DF', 'PF')]
+LGR_COLUMNS = ['Time'] + [name + suffix for name in _LGR_VALUES for suffix in ('', '_se')] + \
+    ['Fit_Flag', "N_Fits_Avg'd", 'MIU_valve', 'MIU_desc.']
+
+#LabView counts seconds from 1904 and the DB computer logs EST, see DB_LGR_py.convert_dates
+LABVIEW_OFFSET = pd.Timedelta(weeks=-66*52-12+1/7, hours=-5).total_seconds()
+
+PGP_BLOCK = '''-----BEGIN PGP MESSAGE-----
+Version: GnuPG v1.2.3 (GNU/Linux)
+
+jA0EAwMCg7fZT5DImRlgye0xUVGpBZYVR85BhLdtH28ePCFgySVvnkjqJA7SFFCN
+MojhO/dNb1e13wk=
+=eV2d
+-----END PGP MESSAGE-----
+'''
+
+
+def synthetic_co2(n_rows, seed=0):
+    '''
+    Synthetic [CO2] and d13C records: a drifting carrier gas baseline with a combustion peak every two hours.
+        Inputs:
+            n_rows (int): number of 1 Hz rows
+            seed (int): seed of the random noise
+        Outputs:
+            co2 (numpy array of floats): [CO2] in ppm
+            d13C (numpy array of floats): measured isotope values
+    '''
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(n_rows)
+    co2 = 500 + 10*np.sin(seconds/20000) + rng.normal(0, 2, n_rows)
+    d13C = -10 + rng.normal(0, 2, n_rows)
+    for center in range(1800, n_rows, 7200):
+        peak = slice(max(center - 600, 0), min(center + 600, n_rows))
+        shape = np.exp(-0.5*((seconds[peak] - center)/90)**2)
+        co2[peak] += 15000*shape
+        d13C[peak] -= 15*shape
+
+    return co2, d13C
+
+def write_DB_file(path, n_rows, start='2023-03-28 08:00:00', lag=30):
+    '''Write a synthetic DB file of n_rows 1 Hz rows, leading the CCIA record by lag seconds.'''
+    co2, _ = synthetic_co2(n_rows + lag)
+    labview = (pd.Timestamp(start) - pd.Timestamp(0)).total_seconds() - LABVIEW_OFFSET + np.arange(n_rows) + 0.497
+    rng = np.random.default_rng(1)
+    columns = [labview, co2[lag:] * 1.05, 36.4 + rng.normal(0, 0.05, n_rows), np.full(n_rows, 34.98),
+               6.3 + rng.normal(0, 0.3, n_rows), np.full(n_rows, 4.03)]
+    lines = ['%.6f\t%.6f\t%.6f\t%.6f\t%.6f\t%.6f' % row for row in zip(*columns)]
+    with open(path, 'w') as f:
+        f.write('\n   '.join(lines) + '\n')
+
+def write_LGR_file(path, n_rows, start='2023-03-28 08:00:00'):
+    '''Write a synthetic CCIA file of n_rows 1 Hz rows with the date line, padded header and PGP footer.'''
+    co2, d13C = synthetic_co2(n_rows)
+    times = pd.Timestamp(start) + pd.to_timedelta(np.arange(n_rows), unit='s') + pd.Timedelta(milliseconds=150)
+    stamps = times.strftime('%m/%d/%y %H:%M:%S.%f').str[:-3]
+    #The measured columns other than [CO2] and d13C are filled from a small pool of rows
+    pool = np.random.default_rng(2).normal(100, 10, (97, len(LGR_COLUMNS) - 5))
+    co2_index = LGR_COLUMNS.index('[CO2]_ppm') - 1
+    d13C_index = LGR_COLUMNS.index('d13C') - 1
+    row_format = '%25s,' + ','.join(['%15.5e'] * pool.shape[1]) + ',%15d,%15d,%15d,%15s'
+    lines = []
+    for block_start in range(0, n_rows, 10000):
+        block = np.arange(block_start, min(block_start + 10000, n_rows))
+        values = pool[block % len(pool)]
+        values[:, co2_index] = co2[block]
+        values[:, d13C_index] = d13C[block]
+        lines.extend(row_format % ((stamps[i],) + tuple(row) + (3, 1, 4, 'unk4')) for i, row in zip(block, values))
+    with open(path, 'w') as f:
+        f.write(pd.Timestamp(start).strftime('%Y %b %d %H:%M:%S') + '\n')
+        f.write(','.join('%15s' % name for name in LGR_COLUMNS) + '\n')
+        f.write('\n'.join(lines) + '\n')
+        f.write(PGP_BLOCK)
+
+def measure(stage, n_rows, function, repeat, trace_memory):
+    '''
+    Time a stage of the pipeline and measure its peak memory.
+        Inputs:
+            stage (string): name of the stage for the report
+            n_rows (int): rows handled by the stage, for the throughput
+            function (function): callable running the stage once
+            repeat (int): the fastest of this many runs is reported
+            trace_memory (boolean): if True, run the stage once more under tracemalloc for the peak memory
+        Outputs:
+            result (dictionary): one row of the report
+    '''
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+        plt.close('all')
+    peak = np.nan
+    if trace_memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        plt.close('all')
+    best = min(durations)
+
+    return {'stage': stage, 'rows': n_rows, 'seconds': best, 'rows/s': n_rows/best if best else np.inf, 'peak MiB': peak}
+
+def run_benchmarks(sizes, repeat=1, trace_memory=True, directory=None):
+    '''
+    Generate synthetic files of each size and benchmark the pipeline on them.
+        Inputs:
+            sizes (list of strings): keys of SIZES, e.g. ['10min', '1h', '1d']
+            repeat (int): number of timed runs of each stage, the fastest is reported
+            trace_memory (boolean): measure peak memory with tracemalloc
+            directory (string): where to write the synthetic files. Default None uses a temporary directory
+        Outputs:
+            report_df (dataframe): one row per size and stage
+    '''
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for size in sizes:
+            n_rows = SIZES[size]
+            db_file = os.path.join(tmp, 'DB-9%s-20230328.txt' % size)
+            ccia_file = os.path.join(tmp, 'ccia_%s_f0000.txt' % size)
+            start = time.perf_counter()
+            write_DB_file(db_file, n_rows)
+            write_LGR_file(ccia_file, n_rows)
+            print('%s: wrote %d rows per file in %.1f s' % (size, n_rows, time.perf_counter() - start))
+
+            db_df = dblgr.import_DB(db_file)
+            ccia_df = dblgr.import_LGR(ccia_file)
+            raw_db_df = pd.read_csv(db_file, delimiter='\t', header=None, names=dblgr.DB_COLUMNS)
+            dblgr.import_LGR(ccia_file, cache=True)
+            window = (ccia_df['Time'].iloc[0], ccia_df['Time'].iloc[-1])
+            stages = [
+                ('import_DB', lambda: dblgr.import_DB(db_file)),
+                ('convert_dates', lambda: dblgr.convert_dates(raw_db_df.copy())),
+                ('import_LGR', lambda: dblgr.import_LGR(ccia_file)),
+                ('import_LGR compact', lambda: dblgr.import_LGR(ccia_file, columns=['[CO2]_ppm', 'd13C'], compact=True)),
+                ('load_cached', lambda: dblgr.import_LGR(ccia_file, columns=['[CO2]_ppm', 'd13C'], cache=True)),
+                ('time_window', lambda: dblgr.time_window(ccia_df, *window)),
+                ('find_time_lag', lambda: dblgr.find_time_lag(ccia_df, db_df)),
+                ('peak_summary', lambda: dblgr.peak_summary(ccia_df, 13)),
+                ('compare_CCIA', lambda: dblgr.compare_CCIA([ccia_file], [window], ['k'], ['run'], max_workers=1)),
+                ('isotope_concentration_plot', lambda: dblgr.isotope_concentration_plot(
+                    ccia_df[['Time', '[CO2]_ppm', 'd13C']].copy(), 13, 2, 2.75, window)),
+            ]
+            for stage, function in stages:
+                results.append(dict(measure(stage, n_rows, function, repeat, trace_memory), size=size))
+                print('    %-28s %8.3f s' % (stage, results[-1]['seconds']))
+
+    report_df = pd.DataFrame(results, columns=['size', 'stage', 'rows', 'seconds', 'rows/s', 'peak MiB'])
+
+    return report_df
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the DB_LGR_py pipeline on synthetic DB and CCIA files.')
+    parser.add_argument('--sizes', nargs='+', default=['10min', '1h', '1d'], choices=list(SIZES),
+                        help='amounts of 1 Hz data to generate (default: 10min 1h 1d)')
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per stage, the fastest is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory runs')
+    parser.add_argument('--dir', default=None, help='directory for the synthetic files (default: a temporary directory)')
+    parser.add_argument('--debug', action='store_true', help='turn on DB_LGR_py.DEBUG and its per-stage timing log')
+    args = parser.parse_args()
+
+    dblgr.DEBUG = args.debug
+    report_df = run_benchmarks(args.sizes, args.repeat, not args.no_memory, args.dir)
+    print()
+    print(report_df.to_string(index=False, float_format=lambda x: '%.4g' % x))
+
+
+if __name__ == '__main__':
+    main()